@@ -3,6 +3,10 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 from __future__ import print_function
+import os
+import subprocess
+import sys
+import threading
 import unittest
 
 from continuous_delivery.models import CiResult
@@ -21,6 +25,9 @@ from vsts_cd_manager.continuous_delivery_manager import ContinuousDeliveryManage
 
 
 class TestContinousDeliveryManager(unittest.TestCase):
+    def setUp(self):
+        ContinuousDeliveryManager.clear_cache()
+
     def fake_callback(self):
         pass
 
@@ -28,6 +35,28 @@ class TestContinousDeliveryManager(unittest.TestCase):
         cdman = ContinuousDeliveryManager(None)
         cdman = ContinuousDeliveryManager(self.fake_callback)
 
+    def test_lazy_client_imports(self):
+        # run in a fresh interpreter so the clients have not been loaded yet
+        script = '\n'.join([
+            "import sys",
+            "from mock import patch",
+            "from vsts_cd_manager import continuous_delivery_manager as cdm",
+            "assert 'msrest' not in sys.modules",
+            "with patch('vsts_cd_manager.continuous_delivery_manager.Account') as mock_account:",
+            "    cdm._load_clients()",
+            "    assert cdm.Account is mock_account",
+            "assert cdm.Account is None",
+            "cdm._load_clients()",
+            "from aex_accounts import Account",
+            "from continuous_delivery.models import BuildConfiguration",
+            "assert cdm.Account is Account",
+            "assert cdm.BuildConfiguration is BuildConfiguration",
+            "with patch('vsts_cd_manager.continuous_delivery_manager.Account'):",
+            "    pass",
+            "assert cdm.Account is Account"])
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.check_call([sys.executable, '-c', script], cwd=repo_root)
+
     def test_get_vsts_app_id(self):
         cdman = ContinuousDeliveryManager(None)
         self.assertEqual('499b84ac-1321-427f-aa17-267ca6975798', cdman.get_vsts_app_id())
@@ -100,13 +129,73 @@ class TestContinousDeliveryManager(unittest.TestCase):
         self.assertEqual('https://account1.visualstudio.com', result.vsts_account_url)
         self.assertEqual('https://account1.visualstudio.com/333/_build?_a=simple-process&definitionId=123', result.vsts_build_def_url)
         self.assertEqual('https://account1.visualstudio.com/333/_apps/hub/ms.vss-releaseManagement-web.hub-explorer?definitionId=321&_a=releases', result.vsts_release_def_url)
+        # callers serialize the result through its __dict__
+        self.assertEqual('SUCCESS', vars(result)['status'])
+
+        # call setup again, the account creation is cached
+        result = cdman.setup_continuous_delivery('staging', app_type_details, "https://account1.visualstudio.com", True, 'token2', None, None)
+        self.assertEqual(True, result.vsts_account_created)
+        self.assertEqual(1, mocked_account.create_account.call_count)
 
         # call setup
+        ContinuousDeliveryManager.clear_cache()
         mocked_account.create_account.return_value = Collection(None, 'collection111')        
         with self.assertRaises(RuntimeError) as context:
             cdman.setup_continuous_delivery('staging', app_type_details, "https://account1.visualstudio.com", True, 'token2', None, None)
         self.assertTrue('Account creation failed' in str(context.exception))
 
+    @patch("vsts_cd_manager.continuous_delivery_manager.Account")
+    def test_create_vsts_account_does_not_block_other_accounts(self, mock_account):
+        first_account_started = threading.Event()
+        other_account_created = threading.Event()
+        waits = []
+        def create_account(name, region):
+            if name == 'account1':
+                # account1 is still being created while account2 is requested
+                first_account_started.set()
+                waits.append(other_account_created.wait(5))
+            else:
+                other_account_created.set()
+            return Collection('111', name)
+        mock_account.return_value.create_account.side_effect = create_account
+        cdman = ContinuousDeliveryManager(None)
+        creator = threading.Thread(target=cdman.create_vsts_account, args=('fakeCreds', 'account1'))
+        creator.start()
+        first_account_started.wait(5)
+        self.assertTrue(cdman.create_vsts_account('fakeCreds', 'account2'))
+        creator.join()
+        self.assertEqual([True], waits)
+        self.assertTrue(cdman.create_vsts_account('fakeCreds', 'account1'))
+        self.assertEqual(2, mock_account.return_value.create_account.call_count)
+
+    @patch("vsts_cd_manager.continuous_delivery_manager.time.sleep")
+    def test_wait_for_cd_completion(self, mock_sleep):
+        progress = Mock()
+        cdman = ContinuousDeliveryManager(progress)
+        mocked_cd = Mock()
+        mocked_cd.get_provisioning_configuration.side_effect = [
+            self._get_provisioning_config('queued', ''),
+            self._get_provisioning_config('inProgress', ''),
+            self._get_provisioning_config('inProgress', ''),
+            self._get_provisioning_config('succeeded', '')]
+        config = cdman._wait_for_cd_completion(mocked_cd, self._get_provisioning_config('queued', ''))
+        self.assertEqual('succeeded', config.ci_configuration.result.status)
+        delays = [args[0] for args, _ in mock_sleep.call_args_list]
+        self.assertEqual(3, len(delays))
+        for delay, base in zip(delays, [0.5, 1, 2]):
+            self.assertTrue(base <= delay <= base * 1.1)
+        messages = [args[2] for args, _ in progress.call_args_list]
+        self.assertEqual(['Setting up Team Services continuous deployment',
+                          'Setting up Team Services continuous deployment (queued)',
+                          'Setting up Team Services continuous deployment (inProgress)',
+                          'Setting up Team Services continuous deployment (inProgress)',
+                          'Setting up Team Services continuous deployment (SUCCEEDED)'], messages)
+
+        mocked_cd.get_provisioning_configuration.side_effect = [self._get_provisioning_config('failed', 'bad config')]
+        with self.assertRaises(RuntimeError) as context:
+            cdman._wait_for_cd_completion(mocked_cd, self._get_provisioning_config('queued', ''))
+        self.assertTrue('bad config' in str(context.exception))
+
     def test_get_provisioning_configuration_target(self):
         cdman = ContinuousDeliveryManager(None)
         cdman.set_azure_web_info('group1', 'web1', 'fakeCreds', 'sub1', 'subname1', 'tenant1', 'South Central US')
@@ -162,6 +251,94 @@ class TestContinousDeliveryManager(unittest.TestCase):
                 with self.assertRaises(RuntimeError):
                     cdman._get_build_configuration(app_type_details)
 
+    def test_get_source_repository(self):
+        cdman = ContinuousDeliveryManager(None)
+        cdman._get_vsts_info = self._mock_get_vsts_info
+        repo, account_name, project_name = cdman._get_source_repository(
+            'https://collection111.visualstudio.com/project1/_git/repo222', None, 'master', 'fakeCreds', None, None)
+        self.assertEqual('TfsGit', repo.type)
+        self.assertEqual('222', repo.identifier)
+        self.assertEqual('collection111', account_name)
+        self.assertEqual('project1', project_name)
+        repo, account_name, project_name = cdman._get_source_repository(
+            'HTTPS://GitHub.com/owner1/repo1.git', 'token1', 'master', 'fakeCreds', None, None)
+        self.assertEqual('Github', repo.type)
+        self.assertEqual('owner1/repo1', repo.identifier)
+        self.assertEqual(None, account_name)
+        repo, account_name, project_name = cdman._get_source_repository(
+            'https://collection111.visualstudio.com/project1', None, 'master', 'fakeCreds', None, None)
+        self.assertEqual('TFVC', repo.type)
+        self.assertEqual('project1', repo.identifier)
+        self.assertEqual('collection111', account_name)
+        repo, account_name, project_name = cdman._get_source_repository(
+            'ftps://github.com/owner1/repo1', 'token1', 'master', 'fakeCreds', 'user1', 'pass1')
+        self.assertEqual('Git', repo.type)
+        self.assertEqual('ftps://github.com/owner1/repo1', repo.identifier)
+        self.assertEqual('UsernamePassword', repo.authorization_info.scheme)
+
+    @patch("vsts_cd_manager.continuous_delivery_manager.VstsInfoProvider")
+    def test_get_vsts_info(self, mock_vsts_info):
+        mock_vsts_info.return_value.get_vsts_info.return_value = self._mock_get_vsts_info(None, None)
+        cdman = ContinuousDeliveryManager(None)
+        repo_url = 'https://collection111.visualstudio.com/project1/_git/repo222'
+        info = cdman._get_vsts_info(repo_url, 'fakeCreds')
+        self.assertEqual('222', info.repository_info.id)
+        self.assertIs(info, cdman._get_vsts_info(repo_url, 'fakeCreds'))
+        self.assertEqual(1, mock_vsts_info.return_value.get_vsts_info.call_count)
+        ContinuousDeliveryManager.clear_cache()
+        cdman._get_vsts_info(repo_url, 'fakeCreds')
+        self.assertEqual(2, mock_vsts_info.return_value.get_vsts_info.call_count)
+
+    @patch("vsts_cd_manager.continuous_delivery_manager.VstsInfoProvider")
+    def test_get_vsts_info_cache_is_bounded(self, mock_vsts_info):
+        cdman = ContinuousDeliveryManager(None)
+        cache_size = ContinuousDeliveryManager._VSTS_INFO_CACHE_SIZE
+        for i in range(cache_size + 1):
+            cdman._get_vsts_info('https://collection111.visualstudio.com/project1/_git/repo%d' % i, 'fakeCreds')
+        self.assertEqual(cache_size, len(ContinuousDeliveryManager._vsts_info_cache))
+        # the least recently used entry was evicted
+        cdman._get_vsts_info('https://collection111.visualstudio.com/project1/_git/repo0', 'fakeCreds')
+        self.assertEqual(cache_size + 2, mock_vsts_info.return_value.get_vsts_info.call_count)
+
+    def test_prefetch_vsts_token(self):
+        cdman = ContinuousDeliveryManager(None)
+        creds = Mock()
+        cdman._prefetch_vsts_token(creds)
+        cdman._prefetch_vsts_token(creds)
+        creds.get_token.assert_called_once_with('499b84ac-1321-427f-aa17-267ca6975798/.default')
+        # failures are not fatal and are retried on the next setup
+        failing_creds = Mock()
+        failing_creds.get_token.side_effect = ValueError('no token')
+        cdman._prefetch_vsts_token(failing_creds)
+        cdman._prefetch_vsts_token(failing_creds)
+        self.assertEqual(2, failing_creds.get_token.call_count)
+        # credentials without get_token are skipped
+        cdman._prefetch_vsts_token('fakeCreds')
+        # a slow token request does not block prefetching for other credentials
+        first_token_started = threading.Event()
+        other_token_fetched = threading.Event()
+        waits = []
+        slow_creds = Mock()
+        def slow_get_token(scope):
+            first_token_started.set()
+            waits.append(other_token_fetched.wait(5))
+        slow_creds.get_token.side_effect = slow_get_token
+        fast_creds = Mock()
+        fast_creds.get_token.side_effect = lambda scope: other_token_fetched.set()
+        prefetcher = threading.Thread(target=cdman._prefetch_vsts_token, args=(slow_creds,))
+        prefetcher.start()
+        first_token_started.wait(5)
+        cdman._prefetch_vsts_token(fast_creds)
+        prefetcher.join()
+        self.assertEqual([True], waits)
+        # inputs are verified before any token is requested
+        creds = Mock()
+        cdman.set_azure_web_info('group1', 'web1', creds, 'sub1', 'subname1', 'tenant1', 'South Central US')
+        cdman.set_repository_info('repoUrl1', 'master1', 'token1', None, None)
+        with self.assertRaises(RuntimeError):
+            cdman.setup_continuous_delivery('staging', {}, 'https://account1.example.com', False, 'token2', None, None)
+        self.assertEqual(0, creds.get_token.call_count)
+
     def _set_build_configuration_variables(self, i):
         if(i==0):
             return 'Python', None, 'Django', 'Python 2.7.12 x64', 'app_working_dir'
@@ -183,7 +360,7 @@ class TestContinousDeliveryManager(unittest.TestCase):
     def _mock_get_vsts_info(self, vsts_repo_url, cred):
         collection_info = CollectionInfo('111', 'collection111', 'https://collection111.visualstudio.com')
         project_info = TeamProjectInfo('333', 'project1', 'https://collection111.visualstudio.com/project1', 'good', '1')
-        repository_info = RepositoryInfo('222', 'repo222', 'https://collection111.visualstudio.com/project1/_git/repo222', project_info)
+        repository_info = RepositoryInfo('222', 'repo222', 'https://collection111.visualstudio.com/project1/_git/repo222', project_info=project_info)
         return VstsInfo('server1', collection_info, repository_info)
 
     def _get_provisioning_config(self, status, status_message):
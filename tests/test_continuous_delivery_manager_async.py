@@ -0,0 +1,88 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+import threading
+import unittest
+
+from aex_accounts.models import Collection
+from continuous_delivery.models import CiResult, CiArtifact, CiConfiguration, ProvisioningConfiguration
+from mock import patch, Mock
+try:
+    import asyncio
+    from vsts_cd_manager.continuous_delivery_manager_async import AsyncContinuousDeliveryManager
+except (ImportError, SyntaxError):
+    asyncio = None
+
+
+@unittest.skipIf(asyncio is None or not hasattr(asyncio, 'run'), 'requires Python 3.7+')
+class TestAsyncContinousDeliveryManager(unittest.TestCase):
+    def setUp(self):
+        AsyncContinuousDeliveryManager.clear_cache()
+
+    @patch("vsts_cd_manager.continuous_delivery_manager_async.asyncio.sleep")
+    @patch("vsts_cd_manager.continuous_delivery_manager.ContinuousDelivery")
+    def test_setup_continuous_delivery_async(self, mock_cd, mock_sleep):
+        mocked_cd = mock_cd.return_value
+        mocked_cd.provisioning_configuration.return_value = self._get_provisioning_config('queued', '')
+        mocked_cd.get_provisioning_configuration.side_effect = [
+            self._get_provisioning_config('inProgress', ''),
+            self._get_provisioning_config('succeeded', '')]
+        progress = Mock()
+        cdman = AsyncContinuousDeliveryManager(progress)
+        cdman.set_azure_web_info('group1', 'web1', 'fakeCreds', 'sub1', 'subname1', 'tenant1', 'South Central US')
+        cdman.set_repository_info('repoUrl1', 'master1', 'token1', None, None)
+        app_type_details = {'cd_app_type': 'AspNet', 'app_working_dir': None}
+
+        result = asyncio.run(cdman.setup_continuous_delivery_async(
+            'staging', app_type_details, "https://account1.visualstudio.com", False, 'token2', None, None))
+        self.assertEqual('SUCCESS', result.status)
+        self.assertEqual(False, result.vsts_account_created)
+        self.assertEqual('https://account1.visualstudio.com/333/_build?_a=simple-process&definitionId=123', result.vsts_build_def_url)
+        self.assertEqual(1, mock_sleep.call_count)
+        self.assertEqual(2, mocked_cd.get_provisioning_configuration.call_count)
+        progress.assert_called_with(100, 100, 'Setting up Team Services continuous deployment (SUCCEEDED)')
+
+    @patch("vsts_cd_manager.continuous_delivery_manager.ContinuousDelivery")
+    @patch("vsts_cd_manager.continuous_delivery_manager.Account")
+    def test_setup_continuous_delivery_async_progress_on_loop_thread(self, mock_account, mock_cd):
+        mocked_cd = mock_cd.return_value
+        mocked_cd.provisioning_configuration.return_value = self._get_provisioning_config('queued', '')
+        mocked_cd.get_provisioning_configuration.return_value = self._get_provisioning_config('succeeded', '')
+        mock_account.return_value.create_account.return_value = Collection('111', 'collection111')
+        progress_threads = []
+        def progress(count, total, message):
+            progress_threads.append(threading.current_thread())
+        cdman = AsyncContinuousDeliveryManager(progress)
+        cdman.set_azure_web_info('group1', 'web1', 'fakeCreds', 'sub1', 'subname1', 'tenant1', 'South Central US')
+        cdman.set_repository_info('repoUrl1', 'master1', 'token1', None, None)
+        app_type_details = {'cd_app_type': 'AspNet', 'app_working_dir': None}
+
+        result = asyncio.run(cdman.setup_continuous_delivery_async(
+            'staging', app_type_details, "https://account1.visualstudio.com", True, 'token2', None, None))
+        self.assertEqual(True, result.vsts_account_created)
+        # account creation progress (reported from the executor) plus the wait progress
+        self.assertEqual(4, len(progress_threads))
+        self.assertEqual([threading.current_thread()] * 4, progress_threads)
+        self.assertIs(progress, cdman._update_progress)
+
+    @patch("vsts_cd_manager.continuous_delivery_manager_async.asyncio.sleep")
+    def test_wait_for_cd_completion_async_failed(self, mock_sleep):
+        cdman = AsyncContinuousDeliveryManager(None)
+        mocked_cd = Mock()
+        mocked_cd.get_provisioning_configuration.return_value = self._get_provisioning_config('failed', 'bad config')
+        with self.assertRaises(RuntimeError) as context:
+            asyncio.run(cdman._wait_for_cd_completion_async(mocked_cd, self._get_provisioning_config('queued', '')))
+        self.assertTrue('bad config' in str(context.exception))
+        self.assertEqual(0, mock_sleep.call_count)
+
+    def _get_provisioning_config(self, status, status_message):
+        ci_config = CiConfiguration(
+            CiArtifact('333', 'project1', 'https://collection111.visualstudio.com/project1'),
+            CiArtifact('123', 'builddef123', 'https://collection111.visualstudio.com/project1/build/definition/123'),
+            CiArtifact('321', 'releasedef321', 'https://collection111.visualstudio.com/project1/release/definition/321'),
+            CiResult(status, status_message))
+        return ProvisioningConfiguration('abcd', None, None, ci_config)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,25 +4,115 @@
 # --------------------------------------------------------------------------------------------
 
 from __future__ import print_function
+import functools
+import random
 import re
+import threading
 import time
 import uuid
+from collections import OrderedDict
+from sys import stderr
 
 try:
-    from urllib.parse import quote, urlparse
+    from urllib.parse import quote
 except ImportError:
     from urllib import quote  #pylint: disable=no-name-in-module
-    from urlparse import urlparse  #pylint: disable=import-error
-from vsts_info_provider import VstsInfoProvider
-from continuous_delivery import ContinuousDelivery
-from continuous_delivery.models import (AuthorizationInfo, AuthorizationInfoParameters, BuildConfiguration,
-                                        CiArtifact, CiConfiguration, ProvisioningConfiguration,
-                                        ProvisioningConfigurationSource, ProvisioningConfigurationTarget,
-                                        SlotSwapConfiguration, SourceRepository, CreateOptions)
-from aex_accounts import Account
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    _monotonic = time.time
+
+# The REST clients and models (and msrest/requests behind them) are imported by _load_clients the first time they
+# are needed, so importing this module stays cheap. Until then the module-level names below are None; they can be
+# replaced (e.g. patched in tests) before or after loading and a replacement is never overwritten.
+VstsInfoProvider = None
+ContinuousDelivery = None
+Account = None
+AuthorizationInfo = None
+AuthorizationInfoParameters = None
+BuildConfiguration = None
+CiArtifact = None
+CiConfiguration = None
+ProvisioningConfiguration = None
+ProvisioningConfigurationSource = None
+SlotSwapConfiguration = None
+SourceRepository = None
+CreateOptions = None
+_LAZY_NAMES = ('VstsInfoProvider', 'ContinuousDelivery', 'Account', 'AuthorizationInfo', 'AuthorizationInfoParameters',
+               'BuildConfiguration', 'CiArtifact', 'CiConfiguration', 'ProvisioningConfiguration',
+               'ProvisioningConfigurationSource', 'SlotSwapConfiguration', 'SourceRepository', 'CreateOptions')
+
+
+def _load_clients():
+    module_globals = globals()
+    # only the names that are still None are filled in, so a patch restored to None is reloaded on the next call
+    missing = [name for name in _LAZY_NAMES if module_globals[name] is None]
+    if missing:
+        from vsts_info_provider import VstsInfoProvider as vsts_info_provider_class
+        from continuous_delivery import ContinuousDelivery as continuous_delivery_class, models
+        from aex_accounts import Account as account_class
+        clients = {'VstsInfoProvider': vsts_info_provider_class, 'ContinuousDelivery': continuous_delivery_class,
+                   'Account': account_class}
+        for name in missing:
+            module_globals[name] = clients[name] if name in clients else getattr(models, name)
+
+
+_make_target = None
+
+
+def _target_factory():
+    # ProvisioningConfigurationTarget with the provider and target type every target shares, built once
+    global _make_target
+    if _make_target is None:
+        from continuous_delivery.models import ProvisioningConfigurationTarget as target_class
+        _make_target = functools.partial(target_class, 'azure', 'windowsAppService')
+    return _make_target
+
+
+# The accepted cd_app_type values, in the order shown in error messages, with their VSTS build configuration type
+_APP_TYPE_BUILD_TYPES = [('AspNet', 'AspNetWap'), ('AspNetCore', 'AspNetCore'), ('NodeJS', 'NodeJS'), ('PHP', 'PHP'),
+                         ('Python', 'Python')]
+_BUILD_TYPES = dict(_APP_TYPE_BUILD_TYPES)
+_ACCEPTED_APP_TYPES = [app_type for app_type, _ in _APP_TYPE_BUILD_TYPES]
+_ACCEPTED_NODEJS_TASK_RUNNERS = ['None', 'Gulp', 'Grunt']
+_ACCEPTED_PYTHON_FRAMEWORKS = ['Bottle', 'Django', 'Flask']
+_ACCEPTED_PYTHON_VERSIONS = ['Python 2.7.12 x64', 'Python 2.7.12 x86', 'Python 2.7.13 x64', 'Python 2.7.13 x86', 'Python 3.5.3 x64', 'Python 3.5.3 x86', 'Python 3.6.0 x64', 'Python 3.6.0 x86', 'Python 3.6.2 x64', 'Python 3.6.1 x86']
+
+# Repository URLs are classified in a single pass; the alternatives are tried in order (TfsGit, Github, TFVC)
+_SOURCE_REPOSITORY_RE = re.compile(r'^https?://(?:'
+                                   r'(?P<tfsgit_account>[^/]+)\.visualstudio\.com.*?/_git/(?P<tfsgit_repo>.+)|'
+                                   r'github\.com/(?P<github_repo>.+)|'
+                                   r'(?P<tfvc_account>[^/]+)\.visualstudio\.com/(?P<tfvc_project>.+))$',
+                                   re.IGNORECASE)
+
+def _poll_delays():
+    # Exponential backoff for provisioning status polls: 0.5s doubling up to 15s, plus up to 10% jitter
+    delay = 0.5
+    while True:
+        yield delay + random.uniform(0, delay * 0.1)
+        delay = min(delay * 2, 15)
 
 # Use this class to setup or remove continuous delivery mechanisms for Azure web sites using VSTS build and release
 class ContinuousDeliveryManager(object):
+    # Accounts already created in this process, keyed on (id(credentials), account name). Each entry holds the
+    # credentials so their id cannot be reused while cached. Creation of the same account is serialized by a
+    # per-key lock from _account_locks; _account_cache_lock only guards the two dicts.
+    _account_cache = {}
+    _account_locks = {}
+    _account_cache_lock = threading.Lock()
+    # Least recently used VSTS repository metadata keyed on (repo url, id(credentials)). Entries reference their
+    # credentials so the id key stays valid; at most _VSTS_INFO_CACHE_SIZE entries are kept.
+    _VSTS_INFO_CACHE_SIZE = 128
+    _vsts_info_cache = OrderedDict()
+    _vsts_info_cache_lock = threading.Lock()
+    # Credentials whose VSTS token has already been acquired in this process, keyed on (id(credentials), scope);
+    # the credentials are held so their id cannot be reused while recorded. Each get_token call runs under a
+    # per-key lock from _token_locks; _token_lock only guards the two dicts.
+    _prefetched_tokens = {}
+    _token_locks = {}
+    _token_lock = threading.Lock()
+
     def __init__(self, progress_callback):
         """
         Use this class to setup or remove continuous delivery mechanisms for Azure web sites using VSTS build and release
@@ -32,6 +122,22 @@ class ContinuousDeliveryManager(object):
         self._azure_info = _AzureInfo()
         self._repo_info = _RepositoryInfo()
 
+    @classmethod
+    def clear_cache(cls):
+        """
+        Use this method to discard the cached account creation results and VSTS repository information,
+        e.g. after a repository has been renamed or moved
+        :return:
+        """
+        with cls._account_cache_lock:
+            cls._account_cache.clear()
+            cls._account_locks.clear()
+        with cls._vsts_info_cache_lock:
+            cls._vsts_info_cache.clear()
+        with cls._token_lock:
+            cls._prefetched_tokens.clear()
+            cls._token_locks.clear()
+
     def get_vsts_app_id(self):
         """
         Use this method to get the 'resource' value for creating an Azure token to be used by VSTS
@@ -97,29 +203,42 @@ class ContinuousDeliveryManager(object):
         :param webapp_list: Existing webapp list
         :return: a message indicating final status and instructions for the user
         """
-
-        branch = self._repo_info.branch or 'refs/heads/master'
+        cd, response, summary_args = self._start_continuous_delivery(swap_with_slot, app_type_details, cd_project_url,
+                                                                     create_account, vsts_app_auth_token, test, webapp_list)
+        final_status = self._wait_for_cd_completion(cd, response)
+        return self._get_summary(final_status, *summary_args)
+
+    def _start_continuous_delivery(self, swap_with_slot, app_type_details, cd_project_url, create_account,
+                                   vsts_app_auth_token, test, webapp_list):
+        # Queues the provisioning configuration and returns the CD client, the queued response and the
+        # arguments for _get_summary once the configuration completes
+        azure_info = self._azure_info
+        repo_info = self._repo_info
+        credentials = azure_info.credentials
+        branch = repo_info.branch or 'refs/heads/master'
         self._validate_cd_project_url(cd_project_url)
         vsts_account_name = self._get_vsts_account_name(cd_project_url)
 
         # Verify inputs before we start generating tokens
-        source_repository, account_name, team_project_name = self._get_source_repository(self._repo_info.url,
-            self._repo_info.git_token, branch, self._azure_info.credentials, 
-            self._repo_info._private_repo_username, self._repo_info._private_repo_password)
+        source_repository, account_name, team_project_name = self._get_source_repository(repo_info.url,
+            repo_info.git_token, branch, credentials,
+            repo_info._private_repo_username, repo_info._private_repo_password)
         self._verify_vsts_parameters(vsts_account_name, source_repository)
+        self._prefetch_vsts_token(credentials)
         vsts_account_name = vsts_account_name or account_name
-        cd_project_name = team_project_name or self._azure_info.website_name
-        account_url = 'https://{}.visualstudio.com'.format(quote(vsts_account_name))
-        portalext_account_url = 'https://{}.portalext.visualstudio.com'.format(quote(vsts_account_name))
+        cd_project_name = team_project_name or azure_info.website_name
+        quoted_account_name = quote(vsts_account_name)
+        account_url = 'https://%s.visualstudio.com' % quoted_account_name
+        portalext_account_url = 'https://%s.portalext.visualstudio.com' % quoted_account_name
 
         # VSTS Account using AEX APIs
         account_created = False
         if create_account:
-            self.create_vsts_account(self._azure_info.credentials, vsts_account_name)
-            account_created = True
+            account_created = self.create_vsts_account(credentials, vsts_account_name)
         
         # Create ContinuousDelivery client
-        cd = ContinuousDelivery('3.2-preview.1', portalext_account_url, self._azure_info.credentials)
+        _load_clients()
+        cd = ContinuousDelivery('3.2-preview.1', portalext_account_url, credentials)
 
         # Construct the config body of the continuous delivery call
         build_configuration = self._get_build_configuration(app_type_details)
@@ -131,15 +250,39 @@ class ContinuousDeliveryManager(object):
 
         # Configure the continuous deliver using VSTS as a backend
         response = cd.provisioning_configuration(config)
-        if response.ci_configuration.result.status == 'queued':
-            final_status = self._wait_for_cd_completion(cd, response)
-            return self._get_summary(final_status, account_url, vsts_account_name, account_created, self._azure_info.subscription_id,
-                                     self._azure_info.resource_group_name, self._azure_info.website_name)
-        else:
+        if response.ci_configuration.result.status != 'queued':
             raise RuntimeError('Unknown status returned from provisioning_configuration: ' + response.ci_configuration.result.status)
+        return cd, response, (account_url, vsts_account_name, account_created, azure_info.subscription_id,
+                              azure_info.resource_group_name, azure_info.website_name)
     
     def create_vsts_account(self, creds, vsts_account_name):
+        """
+        Creates the VSTS account once per process for a given credentials object and account name.
+        Concurrent callers wait for the first creation to finish; pass the same credentials object to share the result.
+        :param creds: credentials used to call the AEX APIs
+        :param vsts_account_name: name of the account to create
+        :return: True if the account was created
+        """
+        key = (id(creds), vsts_account_name)
+        cache_lock = ContinuousDeliveryManager._account_cache_lock
+        with cache_lock:
+            if key in ContinuousDeliveryManager._account_cache:
+                return True
+            key_lock = ContinuousDeliveryManager._account_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with cache_lock:
+                if key in ContinuousDeliveryManager._account_cache:
+                    return True
+            self._create_vsts_account(creds, vsts_account_name)
+            with cache_lock:
+                ContinuousDeliveryManager._account_cache[key] = creds
+                # later callers hit the cache, so the key lock is no longer needed
+                ContinuousDeliveryManager._account_locks.pop(key, None)
+        return True
+
+    def _create_vsts_account(self, creds, vsts_account_name):
         aex_url = 'https://app.vsaex.visualstudio.com'
+        _load_clients()
         accountClient = Account('4.0-preview.1', aex_url, creds)
         self._update_progress(0, 100, 'Creating or getting Team Services account information')            
         regions = accountClient.regions()
@@ -152,31 +295,62 @@ class ContinuousDeliveryManager(object):
         else:
             raise RuntimeError('Account creation failed.')
         
+    def _prefetch_vsts_token(self, creds):
+        # Acquire the VSTS token once up front so the Account and ContinuousDelivery clients both use the
+        # credentials' cached token instead of each triggering their own AAD round-trip
+        get_token = getattr(creds, 'get_token', None)
+        if get_token is None:
+            return
+        scope = self.get_vsts_app_id() + '/.default'
+        key = (id(creds), scope)
+        token_lock = ContinuousDeliveryManager._token_lock
+        with token_lock:
+            if key in ContinuousDeliveryManager._prefetched_tokens:
+                return
+            key_lock = ContinuousDeliveryManager._token_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with token_lock:
+                if key in ContinuousDeliveryManager._prefetched_tokens:
+                    return
+            try:
+                get_token(scope)
+            except Exception as ex:  # pylint: disable=broad-except
+                # the clients will request the token themselves, so this is not fatal
+                print('Unable to prefetch the Team Services token:', ex, file=stderr)
+                return
+            with token_lock:
+                ContinuousDeliveryManager._prefetched_tokens[key] = creds
+                # later callers find the recorded prefetch, so the key lock is no longer needed
+                ContinuousDeliveryManager._token_locks.pop(key, None)
+
     def _validate_cd_project_url(self, cd_project_url):
-        if -1 == cd_project_url.find('visualstudio.com') or -1 == cd_project_url.find('https://'):
+        if 'visualstudio.com' not in cd_project_url or 'https://' not in cd_project_url:
             raise RuntimeError('Project URL should be in format https://<accountname>.visualstudio.com/<projectname>')
 
     def _get_vsts_account_name(self, cd_project_url):
         return (cd_project_url.split('.visualstudio.com', 1)[0]).split('https://', 1)[1]
 
     def get_provisioning_configuration_target(self, auth_info, swap_with_slot, test, webapp_list):
+        _load_clients()
+        azure_info = self._azure_info
+        subscription_id = azure_info.subscription_id
+        subscription_name = azure_info.subscription_name
+        tenant_id = azure_info.tenant_id
+        website_name = azure_info.website_name
+        resource_group_name = azure_info.resource_group_name
+        webapp_location = azure_info.webapp_location
         swap_with_slot_config = None if swap_with_slot is None else SlotSwapConfiguration(swap_with_slot)
-        slotTarget = ProvisioningConfigurationTarget('azure', 'windowsAppService', 'production', 'Production',
-                                                 self._azure_info.subscription_id, self._azure_info.subscription_name, 
-                                                 self._azure_info.tenant_id, self._azure_info.website_name, 
-                                                 self._azure_info.resource_group_name, self._azure_info.webapp_location, 
-                                                 auth_info, swap_with_slot_config)
+        make_target = _target_factory()
+        slotTarget = make_target('production', 'Production', subscription_id, subscription_name, tenant_id, website_name,
+                                 resource_group_name, webapp_location, auth_info, swap_with_slot_config)
         target = [slotTarget]
         if test is not None:
             create_options = None
             if webapp_list is not None and not any(s.name == test for s in webapp_list) :
                 app_service_plan_name = 'ServicePlan'+ str(uuid.uuid4())[:13]
-                create_options = CreateOptions(app_service_plan_name, 'Standard', self._azure_info.website_name)
-            testTarget = ProvisioningConfigurationTarget('azure', 'windowsAppService', 'test', 'Load Test',
-                                                    self._azure_info.subscription_id,
-                                                    self._azure_info.subscription_name, self._azure_info.tenant_id,
-                                                    test, self._azure_info.resource_group_name,
-                                                    self._azure_info.webapp_location, auth_info, None, create_options)
+                create_options = CreateOptions(app_service_plan_name, 'Standard', website_name)
+            testTarget = make_target('test', 'Load Test', subscription_id, subscription_name, tenant_id, test,
+                                     resource_group_name, webapp_location, auth_info, None, create_options)
             target.append(testTarget)
         return target        
 
@@ -186,125 +360,147 @@ class ContinuousDeliveryManager(object):
             raise RuntimeError('You must provide a value for cd-account since your repo-url is not a Team Services repository.')
 
     def _get_build_configuration(self, app_type_details):
-        accepted_app_types = ['AspNet', 'AspNetCore', 'NodeJS', 'PHP', 'Python']
-        accepted_nodejs_task_runners = ['None', 'Gulp', 'Grunt']
-        accepted_python_frameworks = ['Bottle', 'Django', 'Flask']
-        accepted_python_versions = ['Python 2.7.12 x64', 'Python 2.7.12 x86', 'Python 2.7.13 x64', 'Python 2.7.13 x86', 'Python 3.5.3 x64', 'Python 3.5.3 x86', 'Python 3.6.0 x64', 'Python 3.6.0 x86', 'Python 3.6.2 x64', 'Python 3.6.1 x86']
-        
-        build_configuration = None
+        _load_clients()
         working_directory = app_type_details.get('app_working_dir')
         app_type = app_type_details.get('cd_app_type')
-        if (app_type == 'AspNet') :
-            build_configuration = BuildConfiguration('AspNetWap', working_directory)
-        elif (app_type == 'AspNetCore') or (app_type == 'PHP') :
-            build_configuration = BuildConfiguration(app_type, working_directory)
-        elif app_type == 'NodeJS' :
+        build_type = _BUILD_TYPES.get(app_type)
+        if build_type is None:
+            raise RuntimeError("The app_type %s was not understood. Accepted values: %s." % (app_type, _ACCEPTED_APP_TYPES))
+        if app_type == 'NodeJS':
             nodejs_task_runner = app_type_details.get('nodejs_task_runner')
-            if any(s == nodejs_task_runner for s in accepted_nodejs_task_runners) :
-                build_configuration = BuildConfiguration(app_type, working_directory, nodejs_task_runner)
-            else:
-                raise RuntimeError("The nodejs_task_runner %s was not understood. Accepted values: %s." % (nodejs_task_runner, accepted_nodejs_task_runners))
-        elif app_type == 'Python' :
+            if nodejs_task_runner not in _ACCEPTED_NODEJS_TASK_RUNNERS:
+                raise RuntimeError("The nodejs_task_runner %s was not understood. Accepted values: %s." % (nodejs_task_runner, _ACCEPTED_NODEJS_TASK_RUNNERS))
+            return BuildConfiguration(build_type, working_directory, nodejs_task_runner)
+        if app_type == 'Python':
             python_framework = app_type_details.get('python_framework')
             python_version = app_type_details.get('python_version')
             django_setting_module = 'DjangoProjectName.settings'
             flask_project_name = 'FlaskProjectName'
-            if any(s == python_framework for s in accepted_python_frameworks) :
-                if any(s == python_version for s in accepted_python_versions) :
-                    python_version = python_version.replace(" ", "").replace(".", "")
-                    build_configuration = BuildConfiguration(app_type, working_directory, None, python_framework, python_version, django_setting_module, flask_project_name)
-                else :
-                    raise RuntimeError("The python_version %s was not understood. Accepted values: %s." % (python_version, accepted_python_versions))
-            else:
-                raise RuntimeError("The python_framework %s was not understood. Accepted values: %s." % (python_framework, accepted_python_frameworks))
-        else:
-            raise RuntimeError("The app_type %s was not understood. Accepted values: %s." % (app_type, accepted_app_types))
-        return build_configuration
+            if python_framework not in _ACCEPTED_PYTHON_FRAMEWORKS:
+                raise RuntimeError("The python_framework %s was not understood. Accepted values: %s." % (python_framework, _ACCEPTED_PYTHON_FRAMEWORKS))
+            if python_version not in _ACCEPTED_PYTHON_VERSIONS:
+                raise RuntimeError("The python_version %s was not understood. Accepted values: %s." % (python_version, _ACCEPTED_PYTHON_VERSIONS))
+            python_version = python_version.replace(" ", "").replace(".", "")
+            return BuildConfiguration(build_type, working_directory, None, python_framework, python_version, django_setting_module, flask_project_name)
+        return BuildConfiguration(build_type, working_directory)
 
     def _get_source_repository(self, uri, token, branch, cred, username, password):
         # Determine the type of repository (TfsGit, github, tfvc, externalGit)
         # Find the identifier and set the properties.
         # Default is externalGit
+        _load_clients()
         type = 'Git'
         identifier = uri
         account_name = None
         team_project_name = None
         auth_info = AuthorizationInfo('UsernamePassword', AuthorizationInfoParameters(None, None, username, password))
         
-        match = re.match(r'[htps]+\:\/\/(.+)\.visualstudio\.com.*\/_git\/(.+)', uri, re.IGNORECASE)
-        if match:
+        # Only URLs that mention github.com or visualstudio.com can match; skip the regex for everything else
+        lower_uri = uri.lower()
+        match = None
+        if 'github.com/' in lower_uri[:30] or '.visualstudio.com' in lower_uri:
+            match = _SOURCE_REPOSITORY_RE.match(uri)
+        if match and match.group('tfsgit_account'):
             type = 'TfsGit'
-            account_name = match.group(1)
+            account_name = match.group('tfsgit_account')
             # we have to get the repo id as the identifier
             info = self._get_vsts_info(uri, cred)
             identifier = info.repository_info.id
             team_project_name = info.repository_info.project_info.name
             auth_info = None
-        else:
-            match = re.match(r'[htps]+\:\/\/github\.com\/(.+)', uri, re.IGNORECASE)
-            if match:
-                if token is not None:                    
-                    type = 'Github'
-                    identifier = match.group(1).replace(".git", "")
-                    auth_info = AuthorizationInfo('PersonalAccessToken', AuthorizationInfoParameters(None, token))
-            else:
-                match = re.match(r'[htps]+\:\/\/(.+)\.visualstudio\.com\/(.+)', uri, re.IGNORECASE)
-                if match:
-                    type = 'TFVC'
-                    identifier = match.group(2)
-                    account_name = match.group(1)
-                    auth_info = None
+        elif match and match.group('github_repo'):
+            if token is not None:
+                type = 'Github'
+                identifier = match.group('github_repo').replace(".git", "")
+                auth_info = AuthorizationInfo('PersonalAccessToken', AuthorizationInfoParameters(None, token))
+        elif match:
+            type = 'TFVC'
+            identifier = match.group('tfvc_project')
+            account_name = match.group('tfvc_account')
+            auth_info = None
         sourceRepository = SourceRepository(type, identifier, branch, auth_info)
         return sourceRepository, account_name, team_project_name
 
     def _get_vsts_info(self, vsts_repo_url, cred):
-        vsts_info_client = VstsInfoProvider('3.2-preview', vsts_repo_url, cred)
-        return vsts_info_client.get_vsts_info()
+        key = (vsts_repo_url, id(cred))
+        cache = ContinuousDeliveryManager._vsts_info_cache
+        with ContinuousDeliveryManager._vsts_info_cache_lock:
+            cached = cache.pop(key, None)
+            if cached is not None:
+                # re-insert to mark the entry as most recently used
+                cache[key] = cached
+        if cached is None:
+            _load_clients()
+            vsts_info_client = VstsInfoProvider('3.2-preview', vsts_repo_url, cred)
+            cached = (cred, vsts_info_client.get_vsts_info())
+            with ContinuousDeliveryManager._vsts_info_cache_lock:
+                cache[key] = cached
+                while len(cache) > ContinuousDeliveryManager._VSTS_INFO_CACHE_SIZE:
+                    cache.popitem(last=False)
+        return cached[1]
 
     def _wait_for_cd_completion(self, cd, response):
         # Wait for the configuration to finish and report on the status
-        step = 5
-        max = 100
-        self._update_progress(step, max, 'Setting up Team Services continuous deployment')
-        config = cd.get_provisioning_configuration(response.id)
-        while config.ci_configuration.result.status == 'queued' or config.ci_configuration.result.status == 'inProgress':
-            step += 5 if step + 5 < max else 0
-            self._update_progress(step, max, 'Setting up Team Services continuous deployment (' + config.ci_configuration.result.status + ')')
-            time.sleep(2)
-            config = cd.get_provisioning_configuration(response.id)
-        if config.ci_configuration.result.status == 'failed':
-            self._update_progress(max, max, 'Setting up Team Services continuous deployment (FAILED)')
-            raise RuntimeError(config.ci_configuration.result.status_message)
-        self._update_progress(max, max, 'Setting up Team Services continuous deployment (SUCCEEDED)')
+        self._update_progress(5, 100, 'Setting up Team Services continuous deployment')
+        # bind the callables used on every poll to locals and read the status once per poll
+        sleep = time.sleep
+        update_progress = self._update_progress
+        get_config = cd.get_provisioning_configuration
+        monotonic = _monotonic
+        delays = _poll_delays()
+        response_id = response.id
+        start = monotonic()
+        config = get_config(response_id)
+        status = config.ci_configuration.result.status
+        while status == 'queued' or status == 'inProgress':
+            # progress advances by 5 every 2 seconds of elapsed time regardless of the poll cadence
+            step = min(5 + 5 * int((monotonic() - start) / 2), 95)
+            update_progress(step, 100, 'Setting up Team Services continuous deployment (' + status + ')')
+            sleep(next(delays))
+            config = get_config(response_id)
+            status = config.ci_configuration.result.status
+        return self._complete_cd(config)
+
+    def _complete_cd(self, config):
+        result = config.ci_configuration.result
+        if result.status == 'failed':
+            self._update_progress(100, 100, 'Setting up Team Services continuous deployment (FAILED)')
+            raise RuntimeError(result.status_message)
+        self._update_progress(100, 100, 'Setting up Team Services continuous deployment (SUCCEEDED)')
         return config
 
     def _get_summary(self, provisioning_configuration, account_url, account_name, account_created, subscription_id, resource_group_name, website_name):
-        summary = '\n'
         if not provisioning_configuration: return None
+        quoted_subscription_id = quote(subscription_id)
+        quoted_resource_group_name = quote(resource_group_name)
+        quoted_website_name = quote(website_name)
+        summary_parts = ['\n']
 
         # Add the vsts account info
         if not account_created:
-            summary += "The Team Services account '{}' was updated to handle the continuous delivery.\n".format(account_url)
+            summary_parts.append("The Team Services account '%s' was updated to handle the continuous delivery.\n" % account_url)
         else:
-            summary += "The Team Services account '{}' was created to handle the continuous delivery.\n".format(account_url)
+            summary_parts.append("The Team Services account '%s' was created to handle the continuous delivery.\n" % account_url)
 
         # Add the subscription info
-        website_url = 'https://portal.azure.com/#resource/subscriptions/{}/resourceGroups/{}/providers/Microsoft.Web/sites/{}/vstscd'.format(
-            quote(subscription_id), quote(resource_group_name), quote(website_name))
-        summary += 'You can check on the status of the Azure web site deployment here:\n'
-        summary += website_url + '\n'
+        website_url = 'https://portal.azure.com/#resource/subscriptions/%s/resourceGroups/%s/providers/Microsoft.Web/sites/%s/vstscd' % (
+            quoted_subscription_id, quoted_resource_group_name, quoted_website_name)
+        summary_parts.append('You can check on the status of the Azure web site deployment here:\n')
+        summary_parts.append(website_url)
+        summary_parts.append('\n')
+        summary = ''.join(summary_parts)
 
         # setup the build url and release url
         build_url = ''
         release_url = ''
         if provisioning_configuration.ci_configuration and provisioning_configuration.ci_configuration.project:
-            project_id = provisioning_configuration.ci_configuration.project.id
+            quoted_project_id = quote(provisioning_configuration.ci_configuration.project.id)
             if provisioning_configuration.ci_configuration.build_definition:
-                build_url = '{}/{}/_build?_a=simple-process&definitionId={}'.format(
-                    account_url, quote(project_id), quote(provisioning_configuration.ci_configuration.build_definition.id))
+                build_url = '%s/%s/_build?_a=simple-process&definitionId=%s' % (
+                    account_url, quoted_project_id, quote(provisioning_configuration.ci_configuration.build_definition.id))
             if provisioning_configuration.ci_configuration.release_definition:
-                release_url = '{}/{}/_apps/hub/ms.vss-releaseManagement-web.hub-explorer?definitionId={}&_a=releases'.format(
-                    account_url, quote(project_id), quote(provisioning_configuration.ci_configuration.release_definition.id))
+                release_url = '%s/%s/_apps/hub/ms.vss-releaseManagement-web.hub-explorer?definitionId=%s&_a=releases' % (
+                    account_url, quoted_project_id, quote(provisioning_configuration.ci_configuration.release_definition.id))
 
         return ContinuousDeliveryResult(account_created, account_url, resource_group_name,
                                         subscription_id, website_name, website_url, summary,
@@ -315,6 +511,9 @@ class ContinuousDeliveryManager(object):
 
 
 class _AzureInfo(object):
+    __slots__ = ('resource_group_name', 'website_name', 'credentials', 'subscription_id', 'subscription_name',
+                 'tenant_id', 'webapp_location')
+
     def __init__(self):
         self.resource_group_name = None
         self.website_name = None
@@ -326,12 +525,14 @@ class _AzureInfo(object):
 
 
 class _RepositoryInfo(object):
+    __slots__ = ('url', 'branch', 'git_token', '_private_repo_username', '_private_repo_password')
+
     def __init__(self):
         self.url = None
         self.branch = None
         self.git_token = None
-        self.private_repo_username = None
-        self.private_repo_password = None
+        self._private_repo_username = None
+        self._private_repo_password = None
 
 
 class ContinuousDeliveryResult(object):
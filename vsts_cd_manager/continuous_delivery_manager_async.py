@@ -0,0 +1,55 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import asyncio
+import functools
+
+from vsts_cd_manager.continuous_delivery_manager import ContinuousDeliveryManager, _monotonic, _poll_delays
+
+
+# Use this class to setup continuous delivery from asyncio code; waiting on provisioning does not block the event loop
+class AsyncContinuousDeliveryManager(ContinuousDeliveryManager):
+    async def setup_continuous_delivery_async(self, swap_with_slot, app_type_details, cd_project_url, create_account,
+                                              vsts_app_auth_token, test, webapp_list):
+        """
+        Coroutine version of setup_continuous_delivery. The blocking REST calls run in the loop's default executor
+        and the waits between provisioning status polls use asyncio.sleep, so several setups (one manager per
+        web site) can run concurrently on a single thread. Requires Python 3.7+.
+        The progress_callback is always invoked on the event loop's thread, also for progress reported while
+        the account is being created in the executor.
+        :return: a message indicating final status and instructions for the user
+        """
+        loop = asyncio.get_running_loop()
+        update_progress = self._update_progress
+
+        def update_progress_threadsafe(count, total, message):
+            loop.call_soon_threadsafe(update_progress, count, total, message)
+
+        self._update_progress = update_progress_threadsafe
+        try:
+            cd, response, summary_args = await loop.run_in_executor(None, functools.partial(
+                self._start_continuous_delivery, swap_with_slot, app_type_details, cd_project_url, create_account,
+                vsts_app_auth_token, test, webapp_list))
+        finally:
+            self._update_progress = update_progress
+        final_status = await self._wait_for_cd_completion_async(cd, response)
+        return self._get_summary(final_status, *summary_args)
+
+    async def _wait_for_cd_completion_async(self, cd, response):
+        # Wait for the configuration to finish and report on the status
+        loop = asyncio.get_running_loop()
+        self._update_progress(5, 100, 'Setting up Team Services continuous deployment')
+        delays = _poll_delays()
+        start = _monotonic()
+        config = await loop.run_in_executor(None, cd.get_provisioning_configuration, response.id)
+        status = config.ci_configuration.result.status
+        while status == 'queued' or status == 'inProgress':
+            # progress advances by 5 every 2 seconds of elapsed time regardless of the poll cadence
+            step = min(5 + 5 * int((_monotonic() - start) / 2), 95)
+            self._update_progress(step, 100, 'Setting up Team Services continuous deployment (' + status + ')')
+            await asyncio.sleep(next(delays))
+            config = await loop.run_in_executor(None, cd.get_provisioning_configuration, response.id)
+            status = config.ci_configuration.result.status
+        return self._complete_cd(config)